@@ -29,10 +29,14 @@ __version_as_int__ = (100 * int(version_split[0])) + (10 * int(version_split[1])
 # Amount staked to be considered as a valid validator
 validator_permit_stake = 1.024e3
 weights_rate_limit = 100
+# Blocks after which unchanged weights are set again, so the validator keeps updating them on chain
+weights_resubmit_rate_limit = 10 * weights_rate_limit
 
 # Validators static vars
 # Time before the specs requests will time out. time unit = seconds
 specs_timeout = 60
+# Time before the specs app is generated again with a new secret key, even if the script did not change. time unit = seconds
+specs_app_rotation_delay = 24 * 60 * 60
 # Time before the proof of work requests will time out. time unit = seconds
 pow_timeout = 30
 # Initial and minimal proof of work difficulty. Needs benchmark and adjustment.
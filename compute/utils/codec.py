@@ -0,0 +1,47 @@
+import ast
+import codecs
+import json
+
+__all__ = ["json_dumps", "json_loads", "bytes_literal_loads"]
+
+try:
+    # Optional, C accelerated json codec
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps(obj) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        except orjson.JSONEncodeError:
+            # i.e. integers above 64 bits, supported by the standard library only
+            pass
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def bytes_literal_loads(data: str) -> bytes:
+    """
+    Decode the repr of a bytes object, i.e. b'...' as exchanged by the specs queries, without the python parser.
+    :param data: the bytes literal, surrounding whitespaces are ignored
+    :return: the decoded bytes
+    """
+    literal = data.strip()
+    if len(literal) >= 3 and literal[0] == "b" and literal[1] in "'\"" and literal[-1] == literal[1]:
+        body = literal[2:-1]
+        try:
+            if "\\" not in body:
+                # i.e. a Fernet token, base64 without escape sequence
+                return body.encode("ascii")
+            return codecs.escape_decode(body.encode("ascii"))[0]
+        except (UnicodeEncodeError, ValueError):
+            pass
+    # Any other form of literal
+    return ast.literal_eval(literal)
@@ -1,26 +1,119 @@
 import sqlite3
+import threading
+from typing import Optional
 
 import bittensor as bt
 
 
 class ComputeDb:
-    def __init__(self):
-        # Connect to the database (or create it if it doesn't exist)
-        self.conn = sqlite3.connect("database.db", check_same_thread=False)
+    def __init__(self, journal_mode: Optional[str] = None):
+        # The journal mode persists in the database file, None keeps the mode set by the validator
+        self.journal_mode = journal_mode
+
+        # Each thread gets its own connection, with WAL the readers do not block the writer
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
         self.init()
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Connect to the database (or create it if it doesn't exist)
+            conn = sqlite3.connect("database.db", check_same_thread=False, cached_statements=256)
+            self.init_pragma(conn)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
     def close(self):
-        self.conn.close()
+        with self._connections_lock:
+            for index, conn in enumerate(self._connections):
+                if index == 0:
+                    # Keep the query planner statistics up to date
+                    conn.execute("PRAGMA optimize")
+                conn.close()
+            self._connections.clear()
+            self._local = threading.local()
 
     def get_cursor(self):
         return self.conn.cursor()
 
+    def init_pragma(self, conn: sqlite3.Connection):
+        """
+        Tune the connection: page_size must be set before the journal mode to apply on a new database file.
+        Use journal_mode=DELETE on network filesystems (NFS...) where WAL is not supported.
+        Without journal_mode, the current mode of the database file is left unchanged.
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute("PRAGMA page_size=4096")
+            if self.journal_mode:
+                cursor.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-65536")  # 64MB
+            cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
+        except Exception as e:
+            bt.logging.error(f"ComputeDb error while setting pragma: {e}")
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def migrate_miner_details(cursor):
+        """
+        Add the specs columns, used to filter the miners directly in SQL, and the details hash column
+        on databases created before them. The specs columns are filled from the stored details, the hash
+        is left empty so the next update of the miner details rewrites the rows.
+        """
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(miner_details)").fetchall()}
+        specs_columns = {
+            "cpu_count": "$.cpu.count",
+            "gpu_capacity": "$.gpu.capacity",
+            "gpu_count": "$.gpu.count",
+            "hard_disk_free": "$.hard_disk.free",
+            "ram_available": "$.ram.available",
+        }
+        for column in [*specs_columns, "hash"]:
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE miner_details ADD COLUMN {column} INTEGER")
+
+        # Backfill the added specs columns, the allocation lookups only filter on them
+        added_specs_columns = [column for column in specs_columns if column not in columns]
+        if added_specs_columns:
+            assignments = ", ".join(f"{column} = json_extract(details, '{specs_columns[column]}')" for column in added_specs_columns)
+            cursor.execute(f"UPDATE miner_details SET {assignments} WHERE json_valid(details)")
+
     def init(self):
         cursor = self.get_cursor()
 
         try:
             cursor.execute("CREATE TABLE IF NOT EXISTS miner (uid INTEGER PRIMARY KEY, ss58_address TEXT UNIQUE)")
-            cursor.execute("CREATE TABLE IF NOT EXISTS miner_details (id INTEGER PRIMARY KEY, hotkey TEXT, details TEXT)")
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS miner_details (
+                    id INTEGER PRIMARY KEY,
+                    hotkey TEXT,
+                    details TEXT,
+                    cpu_count INTEGER,
+                    gpu_capacity INTEGER,
+                    gpu_count INTEGER,
+                    hard_disk_free INTEGER,
+                    ram_available INTEGER,
+                    hash INTEGER
+                )
+            """
+            )
+            self.migrate_miner_details(cursor)
+            # Covering index, the allocation lookups are answered from the index pages only
+            cursor.execute("DROP INDEX IF EXISTS idx_miner_details_specs")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_miner_details_specs_hotkey "
+                "ON miner_details (cpu_count, gpu_capacity, hard_disk_free, ram_available, gpu_count, hotkey)"
+            )
             cursor.execute("CREATE TABLE IF NOT EXISTS tb (id INTEGER PRIMARY KEY, hotkey TEXT, details TEXT)")
             cursor.execute(
                 """
@@ -113,6 +113,14 @@ class ComputeArgPaser(argparse.ArgumentParser):
             type=int,
             default=60,
         )
+        self.add_argument(
+            "--validator.db.journal.mode",
+            type=str,
+            dest="validator_db_journal_mode",
+            choices=["WAL", "DELETE", "TRUNCATE", "PERSIST"],
+            help="SQLite journal mode of the local database. Use DELETE on network filesystems (NFS) not supporting WAL. Default: WAL.",
+            default="WAL",
+        )
 
     def add_miner_argument(self):
         self.add_argument(
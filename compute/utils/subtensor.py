@@ -15,6 +15,10 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 import datetime
+import os
+import pickle
+import time
+import typing
 
 import bittensor as bt
 
@@ -22,6 +26,9 @@ from compute.utils.cache import ttl_cache
 
 bt_blocktime = bt.__blocktime__
 
+# Metagraphs synced by any process of the host, shared between the miners running several hotkeys
+metagraph_cache_dir = os.path.expanduser("~/.bittensor/compute/metagraphs")
+
 
 @ttl_cache(maxsize=1, ttl=bt_blocktime)
 def get_current_block(subtensor: bt.subtensor) -> int:
@@ -40,5 +47,71 @@ def is_registered(wallet: bt.wallet, metagraph: bt.metagraph, subtensor: bt.subt
         return my_subnet_uid
 
 
+def wait_for_next_block(subtensor: bt.subtensor, block: int) -> int:
+    """
+    Wait for a block after the given one, notified by a subscription to the new block headers.
+    Without subscription, i.e. on a connection error, wait half a block and read the current block.
+    :return: the new current block
+    """
+
+    def new_head_handler(obj, update_nr, subscription_id):
+        number = obj["header"]["number"]
+        # Returning a value ends the subscription
+        if number > block:
+            return number
+
+    try:
+        return subtensor.substrate.subscribe_block_headers(new_head_handler)
+    except Exception as e:
+        bt.logging.debug(f"Could not subscribe to the block headers, polling the current block: {e}")
+        time.sleep(bt_blocktime / 2)
+        return subtensor.block
+
+
 def calculate_next_block_time(block_origin, block_destiny) -> datetime.timedelta:
     return datetime.timedelta(seconds=(block_destiny - block_origin) * bt_blocktime)
+
+
+def get_metagraph_cache_path(network: str, netuid: int, block: typing.Optional[int] = None) -> str:
+    cache_dir = os.path.join(metagraph_cache_dir, f"network-{network}", f"netuid-{netuid}")
+    return cache_dir if block is None else os.path.join(cache_dir, f"block-{block}.pkl")
+
+
+def load_cached_metagraph(network: str, netuid: int, block: int, max_block_age: int = 1) -> typing.Optional[bt.metagraph]:
+    """
+    Load the most recent metagraph saved by a process of the host, if synced at most max_block_age blocks before block.
+    :return: the metagraph, None when no recent enough cache exists
+    """
+    try:
+        cache_dir = get_metagraph_cache_path(network, netuid)
+        cached_blocks = [int(name[6:-4]) for name in os.listdir(cache_dir) if name.startswith("block-") and name.endswith(".pkl")]
+        if not cached_blocks or max(cached_blocks) < block - max_block_age:
+            return None
+        with open(get_metagraph_cache_path(network, netuid, max(cached_blocks)), "rb") as file:
+            return pickle.load(file)
+    except Exception:
+        # Missing directory, or file pruned meanwhile by another process: sync from the chain
+        return None
+
+
+def save_cached_metagraph(metagraph: bt.metagraph):
+    """
+    Save the synced metagraph for the other processes of the host, and remove the older ones.
+    The file is written aside then renamed, so a reader never loads a partial file.
+    """
+    try:
+        block = int(metagraph.block.item())
+        cache_dir = get_metagraph_cache_path(metagraph.network, metagraph.netuid)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        cache_path = get_metagraph_cache_path(metagraph.network, metagraph.netuid, block)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(metagraph, file)
+        os.replace(tmp_path, cache_path)
+
+        for name in os.listdir(cache_dir):
+            if name.startswith("block-") and name.endswith(".pkl") and int(name[6:-4]) < block:
+                os.remove(os.path.join(cache_dir, name))
+    except Exception as e:
+        bt.logging.debug(f"Could not save the metagraph cache: {e}")
@@ -17,6 +17,7 @@
 # Step 1: Import necessary libraries and modules
 
 import base64
+import functools
 import json
 import os
 import secrets
@@ -40,8 +41,14 @@ ssh_port = 4444  # Port to map SSH service on the host
 
 
 # Initialize Docker client
+# The docker client (environment parsing, API version negotiation) is built once and reused
+@functools.lru_cache(maxsize=1)
+def get_docker_client():
+    return docker.from_env()
+
+
 def get_docker():
-    client = docker.from_env()
+    client = get_docker_client()
     containers = client.containers.list(all=True)
     return client, containers
 
@@ -15,7 +15,6 @@
 # THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
-import ast
 import os
 import subprocess
 import threading
@@ -25,6 +24,8 @@ import traceback
 import uuid
 import bittensor as bt
 
+from compute.utils.codec import bytes_literal_loads
+
 
 class RequestSpecsProcessor:
     def __init__(self):
@@ -50,7 +51,7 @@ class RequestSpecsProcessor:
     def process_request(self, app_data, request_id):
         bt.logging.info(f"💻 Specs query started {request_id} ...")
         try:
-            app_data = ast.literal_eval(app_data)
+            app_data = bytes_literal_loads(app_data)
 
             main_dir = os.path.dirname(os.path.abspath(__file__))
             file_path = os.path.join(main_dir, f"app_{request_id}")  # Use a unique file name
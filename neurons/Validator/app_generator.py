@@ -16,6 +16,7 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import hashlib
 import os
 import re
 import subprocess
@@ -23,6 +24,12 @@ import threading
 
 import bittensor as bt
 
+main_dir = os.path.dirname(os.path.abspath(__file__))
+script_name = os.path.join(main_dir, "script.py")
+app_name = os.path.join(main_dir, "dist", "script")
+# Line of script.py holding the secret key, rewritten on each generation
+secret_key_pattern = r"secret_key\s*=\s*.*?# key"
+
 
 def read_output(stream):
     while True:
@@ -32,26 +39,30 @@ def read_output(stream):
         bt.logging.trace(f"{__name__}: {line.strip()}")
 
 
-def run(secret_key):
+def run(secret_key) -> bool:
+    """
+    Generate the script app with the secret key.
+    :return: True if pyinstaller built the app, False otherwise
+    """
     try:
         bt.logging.info("💻 Generation of the secret key and script ...")
 
-        main_dir = os.path.dirname(os.path.abspath(__file__))
-        script_name = os.path.join(main_dir, "script.py")
-
         # Read the content of the script.py file
         with open(script_name, "r") as file:
             script_content = file.read()
 
         # Find and replace the script_key value
 
-        pattern = r"secret_key\s*=\s*.*?# key"
-        script_content = re.sub(pattern, f"secret_key = {secret_key}  # key", script_content, count=1)
+        script_content = re.sub(secret_key_pattern, f"secret_key = {secret_key}  # key", script_content, count=1)
 
         # Write the modified content back to the file
         with open(script_name, "w") as file:
             file.write(script_content)
 
+        # Remove the previous app, built with another secret key, so it can not be taken for the new one
+        if os.path.exists(app_name):
+            os.remove(app_name)
+
         # Run the pyinstaller command
         command = f"cd {main_dir} && pyinstaller --onefile script.py"
         try:
@@ -66,8 +77,24 @@ def run(secret_key):
 
             stdout_thread.join()
             stderr_thread.join()
+
+            if process.returncode != 0 or not os.path.exists(app_name):
+                bt.logging.error(f"An error occurred while generating the app, pyinstaller exited with code {process.returncode}.")
+                return False
+            return True
         except subprocess.CalledProcessError as e:
             bt.logging.error("An error occurred while generating the app.")
             bt.logging.error(f"Error output:{e.stderr.decode()}")
     except Exception as e:
         bt.logging.error(f"{e}")
+    return False
+
+
+def get_script_hash():
+    """
+    Hash of the script.py content without its secret key line, it only changes with the code of the script.
+    :return: the sha256 hex digest
+    """
+    with open(script_name, "r") as file:
+        script_content = file.read()
+    return hashlib.sha256(re.sub(secret_key_pattern, "", script_content, count=1).encode()).hexdigest()
@@ -17,13 +17,23 @@
 # DEALINGS IN THE SOFTWARE.
 # Step 1: Import necessary libraries and modules
 import bittensor as bt
+import numpy as np
 import wandb
 
 import compute
 
-__all__ = ["calc_score"]
+__all__ = ["calc_score", "calc_score_batch", "calc_difficulty_batch", "get_registered_hotkeys"]
 
-from compute.utils.math import percent, percent_yield
+from compute.utils.math import force_to_float_or_default
+
+# Define base weights for the PoW
+success_weight = 1
+difficulty_weight = 4
+time_elapsed_weight = 0.05
+failed_penalty_weight = 1
+
+# Stats used by the score, in the column order of calc_score_batch
+score_stats_keys = ["challenge_attempts", "challenge_successes", "last_20_challenge_failed", "challenge_elapsed_time_avg", "challenge_difficulty_avg"]
 
 
 def normalize(val, min_value, max_value):
@@ -52,70 +62,110 @@ def calc_score(response, hotkey, mock=False):
     :param mock: During testing phase
     :return:
     """
-    try:
-        challenge_attempts = prevent_none(response["challenge_attempts"])
-        challenge_successes = prevent_none(response["challenge_successes"])
-        last_20_challenge_failed = prevent_none(response["last_20_challenge_failed"])
-        challenge_elapsed_time_avg = prevent_none(response["challenge_elapsed_time_avg"])
-        challenge_difficulty_avg = prevent_none(response["challenge_difficulty_avg"])
-        has_docker = response.get("has_docker", False)
+    registered_hotkeys = {hotkey} if mock is True else get_registered_hotkeys()
+    return float(calc_score_batch([response], [hotkey], registered_hotkeys)[0])
 
-        if last_20_challenge_failed >= 10 or challenge_successes == 0:
-            return 0
 
-        # Define base weights for the PoW
-        success_weight = 1
-        difficulty_weight = 4
-        time_elapsed_weight = 0.05
-        failed_penalty_weight = 1
+def calc_score_batch(responses: list, hotkeys: list, registered_hotkeys: set) -> np.ndarray:
+    """
+    Method to calculate the scores of all the miners at once, with the same formula as calc_score
+    :param responses: the stats of each miner as described in calc_score, None for a miner without stats
+    :param hotkeys: the hotkey of each miner
+    :param registered_hotkeys: the hotkeys receiving the registration bonus, see get_registered_hotkeys
+    :return: the normalized score of each miner
+    """
+    count = len(responses)
+    stats = np.zeros((count, len(score_stats_keys)), dtype=np.float64)
+    has_docker = np.zeros(count, dtype=bool)
+    has_stats = np.zeros(count, dtype=bool)
+    for index, response in enumerate(responses):
+        if not response:
+            continue
+        try:
+            stats[index] = [prevent_none(response[key]) for key in score_stats_keys]
+            has_docker[index] = bool(response.get("has_docker", False))
+            has_stats[index] = True
+        except Exception as e:
+            bt.logging.error(f"An error occurred while calculating score for the following hotkey - {hotkeys[index]}: {e}")
 
-        # Just in case but in theory, it is not possible to fake the difficulty as it is sent by the validator
-        # Same occurs for the time, it's calculated by the validator so miners can not fake it
-        difficulty = min(challenge_difficulty_avg, compute.pow_max_difficulty) * difficulty_weight
+    challenge_attempts, challenge_successes, last_20_challenge_failed, challenge_elapsed_time_avg, challenge_difficulty_avg = stats.T
 
-        # Success ratio
-        successes_ratio = percent(challenge_successes, challenge_attempts)
-        successes = successes_ratio * success_weight
+    # Just in case but in theory, it is not possible to fake the difficulty as it is sent by the validator
+    # Same occurs for the time, it's calculated by the validator so miners can not fake it
+    difficulty = np.minimum(challenge_difficulty_avg, compute.pow_max_difficulty) * difficulty_weight
 
-        # Apply a bonus for registered miners
-        registration_bonus = check_if_registered(hotkey, mock=mock) * 1
+    # Success ratio
+    successes_ratio = np.divide(challenge_successes, challenge_attempts, out=np.zeros(count), where=challenge_attempts != 0) * 100
+    successes = successes_ratio * success_weight
 
-        # Modifier for elapsed time effect
-        time_elapsed_modifier = percent_yield(challenge_elapsed_time_avg, compute.pow_timeout)
-        time_elapsed = time_elapsed_modifier * time_elapsed_weight
+    # Apply a bonus for registered miners
+    registration_bonus = np.fromiter((hotkey in registered_hotkeys for hotkey in hotkeys), dtype=bool, count=count) * 1
 
-        failed_penalty = failed_penalty_weight * last_20_challenge_failed
+    # Modifier for elapsed time effect
+    time_elapsed_modifier = np.where(
+        challenge_elapsed_time_avg == 0, 100, ((compute.pow_timeout - challenge_elapsed_time_avg) / compute.pow_timeout) * 100
+    )
+    time_elapsed = time_elapsed_modifier * time_elapsed_weight
 
-        # Calculate the score
-        final_score = successes + difficulty + time_elapsed + registration_bonus - failed_penalty
+    failed_penalty = failed_penalty_weight * last_20_challenge_failed
 
-        final_score = final_score if has_docker else final_score / 2
+    # Calculate the score
+    final_score = successes + difficulty + time_elapsed + registration_bonus - failed_penalty
 
-        # Make sure this cant be negative
-        final_score = max(0, final_score)
+    final_score = np.where(has_docker, final_score, final_score / 2)
 
-        # Normalize the score
-        normalized_score = normalize(final_score, 0, 100)
-        return normalized_score
-    except Exception as e:
-        bt.logging.error(f"An error occurred while calculating score for the following hotkey - {hotkey}: {e}")
-        return 0
+    # Make sure this cant be negative
+    final_score = np.maximum(0, final_score)
 
+    # Normalize the score
+    normalized_score = normalize(final_score, 0, 100)
 
-# Check if miner is registered
-def check_if_registered(hotkey, mock=False):
-    try:
-        if mock is True:
-            return True
+    # No score without stats, with too many recent failures or without success
+    return np.where(has_stats & (last_20_challenge_failed < 10) & (challenge_successes != 0), normalized_score, 0)
 
+
+# Calculate the difficulty of the next challenge based on the performance information
+def calc_difficulty_batch(stats: list) -> np.ndarray:
+    """
+    Method to calculate the difficulty of the next challenge of all the miners at once
+    :param stats: the stats of each miner as returned by select_challenge_stats, None for a miner without stats
+    :return: the difficulty of each miner, at least 1
+    """
+    count = len(stats)
+    last_20_difficulty_avg = np.full(count, compute.pow_min_difficulty, dtype=np.float64)
+    last_20_challenge_failed = np.zeros(count)
+    challenge_successes = np.zeros(count)
+    for index, stat in enumerate(stats):
+        if stat:
+            last_20_difficulty_avg[index] = force_to_float_or_default(stat.get("last_20_difficulty_avg"), default=compute.pow_min_difficulty)
+            last_20_challenge_failed[index] = force_to_float_or_default(stat.get("last_20_challenge_failed"))
+            challenge_successes[index] = force_to_float_or_default(stat.get("challenge_successes"))
+
+    # Once enough challenges are solved: harder without failure, easier past 2 failures
+    current_difficulty = np.ceil(last_20_difficulty_avg)
+    difficulty = np.select(
+        [last_20_challenge_failed == 0, last_20_challenge_failed > 2],
+        [current_difficulty + 1, current_difficulty - 1],
+        current_difficulty,
+    )
+    difficulty = np.where(challenge_successes >= 20, difficulty, compute.pow_min_difficulty)
+
+    # Invalid averages (nan, inf) get the minimal difficulty
+    difficulty = np.where(np.isfinite(difficulty), difficulty, compute.pow_min_difficulty)
+    return np.maximum(difficulty, 1).astype(np.int64)
+
+
+# Get the hotkeys of the registered miners, a single wandb query for all the miners
+def get_registered_hotkeys() -> set:
+    try:
         runs = wandb.Api().runs("registered-miners")
-        values = []
-        for run in runs:
-            if "key" in run.summary:
-                values.append(run.summary["key"])
-        if hotkey in values:
-            return True
-        else:
-            return False
+        return {run.summary["key"] for run in runs if "key" in run.summary}
     except Exception as _:
-        return False
+        return set()
+
+
+# Check if miner is registered
+def check_if_registered(hotkey, mock=False):
+    if mock is True:
+        return True
+    return hotkey in get_registered_hotkeys()
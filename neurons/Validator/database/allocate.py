@@ -15,26 +15,49 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import json
+import zlib
 from typing import Tuple, Any
 
 import bittensor as bt
 
+from compute.utils.codec import json_dumps, json_loads
 from compute.utils.db import ComputeDb
 
+# Number of miner_details rows decoded at once, caps the memory used by the scans
+fetch_batch_size = 512
+
+# Constant statements text, so the compiled statements are reused from the connection cache
+SQL_SELECT_MINER_DETAILS = "SELECT id, hotkey, details FROM miner_details"
+SQL_SELECT_MINER_DETAILS_UIDS = "SELECT id FROM miner_details"
+SQL_DELETE_MINER_DETAILS_UID = "DELETE FROM miner_details WHERE id = ?"
+# Only the rows whose content hash changed are rewritten
+SQL_UPSERT_MINER_DETAILS = """
+INSERT INTO miner_details (id, hotkey, details, cpu_count, gpu_capacity, gpu_count, hard_disk_free, ram_available, hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET hotkey         = excluded.hotkey,
+                               details        = excluded.details,
+                               cpu_count      = excluded.cpu_count,
+                               gpu_capacity   = excluded.gpu_capacity,
+                               gpu_count      = excluded.gpu_count,
+                               hard_disk_free = excluded.hard_disk_free,
+                               ram_available  = excluded.ram_available,
+                               hash           = excluded.hash
+WHERE miner_details.hash IS NOT excluded.hash
+"""
+
 
 def select_has_docker_miners_hotkey(db: ComputeDb):
     cursor = db.get_cursor()
     try:
         # Fetch all records from miner_details table
-        cursor.execute("SELECT * FROM miner_details")
-        rows = cursor.fetchall()
+        cursor.execute(SQL_SELECT_MINER_DETAILS)
 
         uid_hotkey_dict = {}
-        for row in rows:
-            details = json.loads(row[2])
-            if details.get("has_docker", False) is True:
-                uid_hotkey_dict[row[0]] = row[1]
+        for rows in iter(lambda: cursor.fetchmany(fetch_batch_size), []):
+            for row in rows:
+                details = json_loads(row[2])
+                if details.get("has_docker", False) is True:
+                    uid_hotkey_dict[row[0]] = row[1]
         return uid_hotkey_dict
     except Exception as e:
         bt.logging.error(f"Error while getting hotkeys from miner_details : {e}")
@@ -43,20 +66,56 @@ def select_has_docker_miners_hotkey(db: ComputeDb):
         cursor.close()
 
 
+# Build the SQL filter matching allocate_check_if_miner_meet on the indexed specs columns
+def allocate_sql_filter(device_requirement) -> Tuple[str, list]:
+    conditions = []
+    params = []
+
+    required_cpu = device_requirement.get("cpu")
+    if required_cpu:
+        conditions.append("cpu_count >= ?")
+        params.append(required_cpu["count"])
+
+    required_gpu = device_requirement.get("gpu")
+    if required_gpu:
+        conditions.append("gpu_capacity = ? AND gpu_count >= ?")
+        params.extend([required_gpu["capacity"], required_gpu["count"]])
+
+    required_hard_disk = device_requirement.get("hard_disk")
+    if required_hard_disk:
+        conditions.append("hard_disk_free >= ?")
+        params.append(required_hard_disk["capacity"])
+
+    required_ram = device_requirement.get("ram")
+    if required_ram:
+        conditions.append("ram_available >= ?")
+        params.append(required_ram["capacity"])
+
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
 # Fetch hotkeys from database that meets device_requirement
 def select_allocate_miners_hotkey(db: ComputeDb, device_requirement):
     cursor = db.get_cursor()
     try:
-        # Fetch all records from miner_details table
-        cursor.execute("SELECT * FROM miner_details")
-        rows = cursor.fetchall()
+        # Let SQLite discard the miners not meeting the numeric requirements
+        where, params = allocate_sql_filter(device_requirement)
 
-        # Check if the miner meets device_requirement
+        # Without gpu type to match, the filter is complete and is served by the covering index
+        if not device_requirement.get("gpu"):
+            cursor.execute(f"SELECT hotkey FROM miner_details{where}", params)
+            return [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"SELECT hotkey, details FROM miner_details{where}", params)
+
+        # Check if the miner meets device_requirement, i.e. the gpu type
         hotkey_list = []
-        for row in rows:
-            details = json.loads(row[2])
-            if allocate_check_if_miner_meet(details, device_requirement) is True:
-                hotkey_list.append(row[1])
+        for rows in iter(lambda: cursor.fetchmany(fetch_batch_size), []):
+            for row in rows:
+                details = json_loads(row[1])
+                if allocate_check_if_miner_meet(details, device_requirement) is True:
+                    hotkey_list.append(row[0])
         return hotkey_list
     except Exception as e:
         bt.logging.error(f"Error while getting hotkeys from miner_details : {e}")
@@ -65,16 +124,41 @@ def select_allocate_miners_hotkey(db: ComputeDb, device_requirement):
         cursor.close()
 
 
+# Extract the specs columns (cpu_count, gpu_capacity, gpu_count, hard_disk_free, ram_available) from the details
+def miner_details_specs(details) -> tuple:
+    def get_spec(device, key):
+        try:
+            return details[device][key]
+        except (KeyError, TypeError):
+            return None
+
+    return (
+        get_spec("cpu", "count"),
+        get_spec("gpu", "capacity"),
+        get_spec("gpu", "count"),
+        get_spec("hard_disk", "free"),
+        get_spec("ram", "available"),
+    )
+
+
 #  Update the miner_details with specs
 def update_miner_details(db: ComputeDb, hotkey_list, benchmark_responses: Tuple[str, Any]):
     cursor = db.get_cursor()
     try:
-        cursor.execute(f"DELETE FROM miner_details")
-        for index, (hotkey, response) in enumerate(benchmark_responses):
-            cursor.execute("INSERT INTO miner_details (id, hotkey, details) VALUES (?, ?, ?)", (hotkey_list[index], hotkey, json.dumps(response)))
-        db.conn.commit()
+        miner_details_to_upsert = []
+        for uid, (hotkey, response) in zip(hotkey_list, benchmark_responses):
+            details = json_dumps(response)
+            details_hash = zlib.crc32(f"{hotkey}:{details}".encode())
+            miner_details_to_upsert.append((uid, hotkey, details, *miner_details_specs(response), details_hash))
+
+        # Remove the miners not part of the responses anymore
+        uids_to_delete = {row[0] for row in cursor.execute(SQL_SELECT_MINER_DETAILS_UIDS).fetchall()} - set(hotkey_list)
+
+        # Apply the changes within a single transaction
+        with db.conn:
+            cursor.executemany(SQL_DELETE_MINER_DETAILS_UID, [(uid,) for uid in uids_to_delete])
+            cursor.executemany(SQL_UPSERT_MINER_DETAILS, miner_details_to_upsert)
     except Exception as e:
-        db.conn.rollback()
         bt.logging.error(f"Error while updating miner_details : {e}")
     finally:
         cursor.close()
@@ -85,35 +169,34 @@ def allocate_check_if_miner_meet(details, required_details):
     if not details:
         return False
     try:
+        # Ordered by selectivity, the first failing device returns
         # CPU side
-        cpu_miner = details["cpu"]
-        required_cpu = required_details["cpu"]
-        if required_cpu and (not cpu_miner or cpu_miner["count"] < required_cpu["count"]):
+        required_cpu = required_details.get("cpu")
+        if required_cpu and (details.get("cpu") or {}).get("count", 0) < required_cpu["count"]:
             return False
 
-        # GPU side
-        gpu_miner = details["gpu"]
-        required_gpu = required_details["gpu"]
-        if required_gpu:
-            if not gpu_miner or gpu_miner["capacity"] != required_gpu["capacity"] or gpu_miner["count"] < required_gpu["count"]:
-                return False
-            else:
-                gpu_name = str(gpu_miner["details"][0]["name"]).lower()
-                required_type = str(required_gpu["type"]).lower()
-                if required_type not in gpu_name:
-                    return False
+        # Ram side
+        required_ram = required_details.get("ram")
+        if required_ram and (details.get("ram") or {}).get("available", 0) < required_ram["capacity"]:
+            return False
 
         # Hard disk side
-        hard_disk_miner = details["hard_disk"]
-        required_hard_disk = required_details["hard_disk"]
-        if required_hard_disk and (not hard_disk_miner or hard_disk_miner["free"] < required_hard_disk["capacity"]):
+        required_hard_disk = required_details.get("hard_disk")
+        if required_hard_disk and (details.get("hard_disk") or {}).get("free", 0) < required_hard_disk["capacity"]:
             return False
 
-        # Ram side
-        ram_miner = details["ram"]
-        required_ram = required_details["ram"]
-        if required_ram and (not ram_miner or ram_miner["available"] < required_ram["capacity"]):
-            return False
+        # GPU side, last as it is rarely required
+        required_gpu = required_details.get("gpu")
+        if required_gpu:
+            gpu_miner = details.get("gpu") or {}
+            if gpu_miner.get("capacity") != required_gpu["capacity"] or gpu_miner.get("count", 0) < required_gpu["count"]:
+                return False
+
+            gpu_details = gpu_miner.get("details") or [{}]
+            gpu_name = str(gpu_details[0].get("name", "")).lower()
+            required_type = str(required_gpu["type"]).lower()
+            if required_type not in gpu_name:
+                return False
     except Exception as e:
         bt.logging.error("The format is wrong, please check it again.")
         return False
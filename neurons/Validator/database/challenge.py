@@ -141,7 +141,8 @@ def update_challenge_details(db: ComputeDb, pow_benchmarks: list):
             for benchmark in pow_benchmarks
         ]
 
-        # Prepare data for bulk insert
+        # Prepare data for bulk insert, the challenges of a batch share the same timestamp
+        created_at = datetime.datetime.now().isoformat()
         challenge_details_to_insert = [
             (
                 benchmark.get("uid"),
@@ -149,19 +150,20 @@ def update_challenge_details(db: ComputeDb, pow_benchmarks: list):
                 benchmark.get("success"),
                 benchmark.get("elapsed_time"),
                 benchmark.get("difficulty"),
-                datetime.datetime.now().isoformat(),
+                created_at,
             )
             for benchmark in pow_benchmarks
         ]
 
         cursor.executemany("INSERT OR IGNORE INTO miner (uid, ss58_address) VALUES (?, ?)", miner_to_insert)
-        db.conn.commit()
 
         # Perform bulk insert using executemany
         cursor.executemany(
             "INSERT INTO challenge_details (uid, ss58_address, success, elapsed_time, difficulty, created_at) VALUES (?, ?, ?, ?, ?, ?)",
             challenge_details_to_insert,
         )
+
+        # Commit both inserts in a single transaction
         db.conn.commit()
     except Exception as e:
         db.conn.rollback()
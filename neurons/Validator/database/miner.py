@@ -49,7 +49,6 @@ def update_miners(db: ComputeDb, miners: list):
     cursor = db.get_cursor()
     try:
         cursor.executemany("INSERT OR IGNORE INTO miner (uid, ss58_address) VALUES (?, ?)", miners)
-        db.conn.commit()
 
         # Commit changes
         db.conn.commit()
@@ -15,8 +15,8 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 # Step 1: Import necessary libraries and modules
+import os
 import psutil
-import GPUtil
 import json
 import time
 import subprocess
@@ -30,46 +30,57 @@ secret_key = b'6iYtkeTvhzeQBAPhfImXj6n4AfJX07exqJV2dzlUDjg='  # key
 def get_cpu_info():
     try:
         # Get the number of physical CPU cores
-        physical_cores = psutil.cpu_count(logical=False)
+        physical_cores = psutil.cpu_count(logical=False) or os.cpu_count()
 
         # Get CPU frequency
         cpu_frequency = psutil.cpu_freq()
 
         info = {}
         info["count"] = physical_cores
-        info["frequency"] = cpu_frequency.current
+        info["frequency"] = cpu_frequency.current if cpu_frequency else get_proc_cpu_frequency()
 
         return info
     except Exception as e:
         return {}
 
 
+# Return the frequency of the first cpu listed in /proc/cpuinfo, used when cpufreq is not exposed (VMs, containers)
+def get_proc_cpu_frequency():
+    with open("/proc/cpuinfo", "r") as file:
+        for line in file:
+            if line.startswith("cpu MHz"):
+                return float(line.split(":")[1])
+    return 0.0
+
+
 # Return the detailed information of gpu
 def get_gpu_info():
     try:
-        # Get existing gpus
-        gpus = GPUtil.getGPUs()
+        # Query every gpu in a single nvidia-smi call, one line per device
+        try:
+            result = subprocess.run(
+                ["nvidia-smi", "--query-gpu=name,memory.total,clocks.gr,clocks.mem", "--format=csv,noheader,nounits"],
+                stdout=subprocess.PIPE,
+            )
+            lines = [line for line in result.stdout.decode().strip().split("\n") if line.strip()]
+        except Exception as e:
+            lines = []
+
+        gpus = []
+        for line in lines:
+            name, memory_total, graphics_speed, memory_speed = [value.strip() for value in line.rsplit(",", 3)]
+            gpus.append({"name": name, "capacity": float(memory_total), "graphics_speed": int(graphics_speed), "memory_speed": int(memory_speed)})
 
         # Get the detailed information for each gpu (name, capacity)
-        gpu_details = []
-        capacity = 0
-        for gpu in gpus:
-            gpu_details.append({"name": gpu.name, "capacity": gpu.memoryTotal})
-            capacity += gpu.memoryTotal
+        gpu_details = [{"name": gpu["name"], "capacity": gpu["capacity"]} for gpu in gpus]
+        capacity = sum(gpu["capacity"] for gpu in gpus)
 
         info = {"count": len(gpus), "capacity": capacity, "details": gpu_details}
 
         # Measure speed
         if len(gpus):
-            # Run nvidia-smi command to get GPU information
-            result = subprocess.run(["nvidia-smi", "--query-gpu=clocks.gr,clocks.mem", "--format=csv,noheader"], stdout=subprocess.PIPE)
-            gpu_speed_info = result.stdout.decode().strip().split(",")
-
-            graphics_speed = int(gpu_speed_info[0].split()[0])
-            memory_speed = int(gpu_speed_info[1].split()[0])
-
-            info["graphics_speed"] = graphics_speed
-            info["memory_speed"] = memory_speed
+            info["graphics_speed"] = gpus[0]["graphics_speed"]
+            info["memory_speed"] = gpus[0]["memory_speed"]
         return info
 
     except Exception as e:
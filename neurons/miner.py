@@ -18,11 +18,12 @@
 import asyncio
 import json
 import os
+import signal
+import threading
 import traceback
 import typing
 
 import bittensor as bt
-import time
 
 from compute import (
     SUSPECTED_EXPLOITERS_HOTKEYS,
@@ -40,6 +41,8 @@ from compute.utils.subtensor import (
     is_registered,
     get_current_block,
     calculate_next_block_time,
+    load_cached_metagraph,
+    save_cached_metagraph,
 )
 from compute.utils.version import (
     check_hashcat_version,
@@ -54,7 +57,8 @@ from neurons.Validator.script import check_docker_availability
 
 
 class Miner:
-    blocks_done: set = set()
+    # Last block the next tasks times were computed for
+    _last_processed_block: int = -1
 
     blacklist_hotkeys: set
     blacklist_coldkeys: set
@@ -68,6 +72,10 @@ class Miner:
     miner_subnet_uid: int
 
     _axon: bt.axon
+    _hotkey_to_uid: dict
+    _stake_by_uid: list
+    _permitted_uids: set
+    _update_thread: typing.Optional[threading.Thread] = None
 
     @property
     def wallet(self) -> bt.wallet:
@@ -118,6 +126,7 @@ class Miner:
 
         # Metagraph provides the network's current state, holding state about other participants in a subnet.
         self._metagraph = self.subtensor.metagraph(self.config.netuid)
+        self.index_metagraph()
         bt.logging.info(f"Metagraph: {self.metagraph}")
 
         has_docker, msg = check_docker_availability()
@@ -146,6 +155,9 @@ class Miner:
 
         self.last_updated_block = self.current_block - (self.current_block % 100)
 
+        # Set on SIGTERM to leave the main loop without waiting for the end of the sleep
+        self._stop_event = threading.Event()
+
     def init_axon(self):
         # Step 6: Build and link miner functions to the axon.
         # The axon handles request processing, allowing validators to send this process requests.
@@ -214,8 +226,26 @@ class Miner:
             self.exploiters_hotkeys_set = set()
 
     def sync_local(self):
-        """Resync our local state with the latest state from the blockchain. Sync scores with metagraph."""
-        self.metagraph.sync(subtensor=self.subtensor)
+        """
+        Resync our local state with the latest state from the blockchain. Sync scores with metagraph.
+        A metagraph synced on the last block by another miner of the host is reused instead of querying the chain.
+        """
+        metagraph = load_cached_metagraph(network=self.subtensor.network, netuid=self.config.netuid, block=self.current_block)
+        if metagraph is None:
+            self.metagraph.sync(subtensor=self.subtensor)
+            save_cached_metagraph(self.metagraph)
+        else:
+            self._metagraph = metagraph
+        self.index_metagraph()
+        # The uid may be reassigned on re-registration, follow it on every sync
+        self.miner_subnet_uid = self._hotkey_to_uid.get(self.wallet.hotkey.ss58_address, self.miner_subnet_uid)
+
+    def index_metagraph(self):
+        """Index the metagraph hotkeys and copy the stakes once per sync, the requests lookups are then done in O(1)."""
+        self._hotkey_to_uid = {hotkey: uid for uid, hotkey in enumerate(self.metagraph.hotkeys)}
+        self._stake_by_uid = self.metagraph.S.tolist()
+        # Uids with enough stake to query the miner, compared at once on the whole tensor
+        self._permitted_uids = set((self.metagraph.S >= validator_permit_stake).nonzero().flatten().tolist())
 
     def sync_status(self):
         self.miner_subnet_uid = is_registered(
@@ -225,9 +255,10 @@ class Miner:
             entity="miner",
         )
 
-        # Check for auto update
-        if self.config.auto_update:
-            try_update()
+        # Check for auto update, in background so the git and pip calls do not hold the main loop
+        if self.config.auto_update and not (self._update_thread and self._update_thread.is_alive()):
+            self._update_thread = threading.Thread(target=try_update, name="th_try_update", daemon=True)
+            self._update_thread.start()
 
         if hasattr(self, "axon"):
             if self.axon:
@@ -243,44 +274,48 @@ class Miner:
         hotkey = synapse.dendrite.hotkey
         synapse_type = type(synapse).__name__
 
-        if hotkey not in self.metagraph.hotkeys:
-            # Ignore requests from unrecognized entities.
-            bt.logging.trace(f"Blacklisting unrecognized hotkey {hotkey}")
-            return True, "Unrecognized hotkey"
-
-        index = self.metagraph.hotkeys.index(hotkey)
-        stake = self.metagraph.S[index].item()
-
-        if stake < validator_permit_stake and not self.miner_whitelist_not_enough_stake:
-            bt.logging.trace(f"Not enough stake {stake}")
-            return True, "Not enough stake!"
-
+        # Cheapest checks first: set lookups on the user and exploiters lists
         if len(self.whitelist_hotkeys) > 0 and hotkey not in self.whitelist_hotkeys:
             return True, "Not whitelisted"
 
         if len(self.blacklist_hotkeys) > 0 and hotkey in self.blacklist_hotkeys:
             return True, "Blacklisted hotkey"
 
-        # Blacklist entities that are not up-to-date
-        if hotkey not in self.whitelist_hotkeys_version and len(self.whitelist_hotkeys_version) > 0:
+        if hotkey in self.exploiters_hotkeys_set:
             return (
                 True,
-                f"Blacklisted a {synapse_type} request from a non-updated hotkey: {hotkey}",
+                f"Blacklisted a {synapse_type} request from an exploiter hotkey: {hotkey}",
             )
 
-        if hotkey in self.exploiters_hotkeys_set:
+        # Blacklist entities that are not up-to-date
+        if hotkey not in self.whitelist_hotkeys_version and len(self.whitelist_hotkeys_version) > 0:
             return (
                 True,
-                f"Blacklisted a {synapse_type} request from an exploiter hotkey: {hotkey}",
+                f"Blacklisted a {synapse_type} request from a non-updated hotkey: {hotkey}",
             )
 
-        bt.logging.trace(f"Not Blacklisting recognized hotkey {synapse.dendrite.hotkey}")
+        index = self._hotkey_to_uid.get(hotkey)
+        if index is None:
+            # Ignore requests from unrecognized entities.
+            # The trace messages are only formatted when the trace level is enabled, this runs on every request.
+            if bt.logging.__trace_on__:
+                bt.logging.trace(f"Blacklisting unrecognized hotkey {hotkey}")
+            return True, "Unrecognized hotkey"
+
+        if index not in self._permitted_uids and not self.miner_whitelist_not_enough_stake:
+            if bt.logging.__trace_on__:
+                bt.logging.trace(f"Not enough stake {self._stake_by_uid[index]}")
+            return True, "Not enough stake!"
+
+        if bt.logging.__trace_on__:
+            bt.logging.trace(f"Not Blacklisting recognized hotkey {hotkey}")
         return False, "Hotkey recognized!"
 
     def base_priority(self, synapse: typing.Union[Specs, Allocate, Challenge]) -> float:
-        caller_uid = self._metagraph.hotkeys.index(synapse.dendrite.hotkey)  # Get the caller index.
-        priority = float(self._metagraph.S[caller_uid])  # Return the stake as the priority.
-        bt.logging.trace(f"Prioritizing {synapse.dendrite.hotkey} with value: ", priority)
+        caller_uid = self._hotkey_to_uid[synapse.dendrite.hotkey]  # Get the caller index.
+        priority = float(self._stake_by_uid[caller_uid])  # Return the stake as the priority.
+        if bt.logging.__trace_on__:
+            bt.logging.trace(f"Prioritizing {synapse.dendrite.hotkey} with value: {priority}")
         return priority
 
     # The blacklist function decides if a request should be ignored.
@@ -421,13 +456,15 @@ class Miner:
         time_next_updated_validator = None
         time_next_sync_status = None
 
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stop_event.set())
+
         bt.logging.info("Starting miner loop.")
-        while True:
+        while not self._stop_event.is_set():
             try:
                 self.sync_local()
 
-                if self.current_block not in self.blocks_done:
-                    self.blocks_done.add(self.current_block)
+                if self.current_block != self._last_processed_block:
+                    self._last_processed_block = self.current_block
 
                     time_next_updated_validator = self.next_info(
                         not block_next_updated_validator == 1,
@@ -443,11 +480,6 @@ class Miner:
                     block_next_sync_status = self.current_block + 25  # ~ every 5 minutes
                     self.sync_status()
 
-                # Periodically clear some vars
-                if len(self.blocks_done) > 1000:
-                    self.blocks_done.clear()
-                    self.blocks_done.add(self.current_block)
-
                 bt.logging.info(
                     f"Block: {self.current_block} | "
                     f"Stake: {self.metagraph.S[self.miner_subnet_uid]:.4f} | "
@@ -458,7 +490,7 @@ class Miner:
                     f"update_validator: #{block_next_updated_validator} ~ {time_next_updated_validator} | "
                     f"sync_status: #{block_next_sync_status} ~ {time_next_sync_status}"
                 )
-                time.sleep(5)
+                self._stop_event.wait(5)
 
             except (RuntimeError, Exception) as e:
                 bt.logging.error(e)
@@ -470,6 +502,9 @@ class Miner:
                 bt.logging.success("Keyboard interrupt detected. Exiting miner.")
                 exit()
 
+        self.axon.stop()
+        bt.logging.success("Termination signal received. Exiting miner.")
+
 
 def main():
     """
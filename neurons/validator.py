@@ -16,21 +16,20 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import ast
 import asyncio
-import json
 import os
 import random
 import threading
 import traceback
 from asyncio import AbstractEventLoop
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
 
+import aiohttp
 import bittensor as bt
-import math
 import time
 
 import cryptography
+import numpy as np
 import torch
 from cryptography.fernet import Fernet
 from torch._C._te import Tensor
@@ -38,50 +37,63 @@ from torch._C._te import Tensor
 import Validator.app_generator as ag
 from Validator.pow import gen_hash, run_validator_pow
 from compute import (
-    pow_min_difficulty,
     pow_timeout,
     SUSPECTED_EXPLOITERS_HOTKEYS,
     SUSPECTED_EXPLOITERS_COLDKEYS,
     __version_as_int__,
     weights_rate_limit,
+    weights_resubmit_rate_limit,
     specs_timeout,
+    specs_app_rotation_delay,
 )
 from compute.axon import ComputeSubnetSubtensor
 from compute.protocol import Challenge, Specs
+from compute.utils.codec import bytes_literal_loads, json_loads
 from compute.utils.db import ComputeDb
-from compute.utils.math import percent, force_to_float_or_default
+from compute.utils.math import percent
 from compute.utils.parser import ComputeArgPaser
-from compute.utils.subtensor import is_registered, get_current_block, calculate_next_block_time
+from compute.utils.subtensor import is_registered, get_current_block, calculate_next_block_time, bt_blocktime, wait_for_next_block
 from compute.utils.version import try_update, get_local_version, version2number, get_remote_version
-from neurons.Validator.calculate_pow_score import calc_score
+from neurons.Validator.calculate_pow_score import calc_score_batch, calc_difficulty_batch, get_registered_hotkeys
 from neurons.Validator.database.allocate import update_miner_details, select_has_docker_miners_hotkey
 from neurons.Validator.database.challenge import select_challenge_stats, update_challenge_details
 from neurons.Validator.database.miner import select_miners, purge_miner_entries, update_miners
 
 
 class Validator:
-    blocks_done: set = set()
+    # Last block the scheduled tasks were checked for
+    _last_processed_block: int = -1
 
     pow_requests: dict = {}
-    pow_responses: dict = {}
     pow_benchmark: dict = {}
     new_pow_benchmark: dict = {}
     pow_benchmark_success: dict = {}
 
     queryable_for_specs: dict = {}
     finalized_specs_once: bool = False
+    # (script hash, generation time, cipher suite, specs input) of the last generated specs app
+    specs_app: Optional[Tuple[str, float, Fernet, str]] = None
 
     total_current_miners: int = 0
 
     scores: Tensor
+    # Uids the scores are indexed by, the metagraph thread may change self.uids meanwhile
+    scores_uids: list
     stats: dict
 
     validator_subnet_uid: int
 
+    # Hash and block of the last weights successfully set
+    _last_weights_hash: Optional[int] = None
+    _last_weights_block: int = 0
+
     _queryable_uids: Dict[int, bt.AxonInfo]
 
     loop: AbstractEventLoop
 
+    _metagraph_lock: threading.RLock
+    _metagraph_refresh_thread: threading.Thread
+
     @property
     def wallet(self) -> bt.wallet:
         return self._wallet
@@ -118,10 +130,6 @@ class Validator:
     def current_block(self):
         return get_current_block(subtensor=self.subtensor)
 
-    @property
-    def miners_items_to_set(self):
-        return set((uid, hotkey) for uid, hotkey in self.miners.items()) if self.miners else None
-
     def __init__(self):
         # Step 1: Parse the bittensor and compute subnet config
         self.config = self.init_config()
@@ -131,8 +139,11 @@ class Validator:
         self.blacklist_coldkeys = {coldkey for coldkey in self.config.blacklist_coldkeys}
         self.whitelist_hotkeys = {hotkey for hotkey in self.config.whitelist_hotkeys}
         self.whitelist_coldkeys = {coldkey for coldkey in self.config.whitelist_coldkeys}
-        self.exploiters_hotkeys = {hotkey for hotkey in SUSPECTED_EXPLOITERS_HOTKEYS} if self.config.blacklist_exploiters else {}
-        self.exploiters_coldkeys = {coldkey for coldkey in SUSPECTED_EXPLOITERS_COLDKEYS} if self.config.blacklist_exploiters else {}
+        self.exploiters_hotkeys = {hotkey for hotkey in SUSPECTED_EXPLOITERS_HOTKEYS} if self.config.blacklist_exploiters else set()
+        self.exploiters_coldkeys = {coldkey for coldkey in SUSPECTED_EXPLOITERS_COLDKEYS} if self.config.blacklist_exploiters else set()
+        # Keys refused whatever the reason, the lists do not change while running
+        self._denied_hotkeys = frozenset(self.blacklist_hotkeys | self.exploiters_hotkeys)
+        self._denied_coldkeys = frozenset(self.blacklist_coldkeys | self.exploiters_coldkeys)
 
         # Set custom validator arguments
         self.validator_specs_batch_size = self.config.validator_specs_batch_size
@@ -162,27 +173,29 @@ class Validator:
         self._dendrite = bt.dendrite(wallet=self.wallet)
         bt.logging.info(f"Dendrite: {self.dendrite}")
 
+        # Dendrite awaited on the validator loop for the challenges, the specs queries keep their own from the executor thread.
+        self._async_dendrite = bt.dendrite(wallet=self.wallet)
+
         # The metagraph holds the state of the network, letting us know about other miners.
         self._metagraph = self.subtensor.metagraph(self.config.netuid)
         bt.logging.info(f"Metagraph: {self.metagraph}")
 
+        # The metagraph is refreshed in background, with its own connection as the subtensor websocket is not thread safe.
+        self._metagraph_lock = threading.RLock()
+        self._metagraph_subtensor = ComputeSubnetSubtensor(config=self.config)
+
         # Initialize the local db
-        self.db = ComputeDb()
+        self.db = ComputeDb(journal_mode=self.config.validator_db_journal_mode)
         self.miners: dict = select_miners(self.db)
 
         # Step 3: Set up initial scoring weights for validation
         bt.logging.info("Building validation weights.")
         self.uids: list = self.metagraph.uids.tolist()
-        self.last_uids: list = self.uids.copy()
         self.init_scores()
         self.sync_status()
 
         self.last_updated_block = self.current_block - (self.current_block % 100)
 
-        # Init the thread.
-        self.lock = threading.Lock()
-        self.threads: List[threading.Thread] = []
-
     @staticmethod
     def init_config():
         """
@@ -228,22 +241,19 @@ class Validator:
             bt.logging.error("Prometheus initialization failed")
         return success
 
-    def init_local(self):
-        bt.logging.info(f"🔄 Syncing metagraph with subtensor.")
-        self._metagraph = self.subtensor.metagraph(self.config.netuid)
-        self.uids = self.metagraph.uids.tolist()
-
     def init_scores(self):
+        # The validators and the nodes without assigned IP addresses are set to zero by sync_scores.
         self.scores = torch.zeros(len(self.uids), dtype=torch.float32)
-        # Set the weights of validators to zero.
-        self.scores = self.scores * (self.metagraph.total_stake < 1.024e3)
-        # Set the weight to zero for all nodes without assigned IP addresses.
-        self.scores = self.scores * torch.Tensor(self.get_valid_tensors(metagraph=self.metagraph))
+        self.scores_uids = self.uids
         bt.logging.info(f"🔢 Initialized scores : {self.scores.tolist()}")
         self.sync_scores()
 
     @staticmethod
     def pretty_print_dict_values(items: dict):
+        # Only printed at trace level, do not format the lines otherwise
+        if not bt.logging.__trace_on__:
+            return
+
         for key, values in items.items():
             log = f"uid: {key}"
 
@@ -267,24 +277,27 @@ class Validator:
 
         self.pretty_print_dict_values(self.stats)
 
-        # Calculate score
-        for uid in self.uids:
-            try:
-                try:
-                    # This part is to ensure the upgrade to 1.3.10 is running smoothly. But should theoretically be removed after it.
-                    if not self.finalized_specs_once:
-                        self.stats[uid]["has_docker"] = True
-                    else:
-                        self.stats[uid]["has_docker"] = has_docker[uid]
-                except KeyError:
-                    self.stats[uid]["has_docker"] = False
+        # Fetch the registered miners once for all the scores
+        registered_hotkeys = get_registered_hotkeys()
+
+        with self._metagraph_lock:
+            uids = self.uids
+            queryable_mask = self.get_queryable_mask(self.metagraph)
 
-                hotkey = self.stats[uid].get("ss58_address")
-                score = calc_score(self.stats[uid], hotkey=hotkey)
-            except (ValueError, KeyError):
-                score = 0
+        responses = []
+        hotkeys = []
+        for uid in uids:
+            stat = self.stats.get(uid)
+            if stat is not None:
+                # This part is to ensure the upgrade to 1.3.10 is running smoothly. But should theoretically be removed after it.
+                stat["has_docker"] = True if not self.finalized_specs_once else uid in has_docker
+            responses.append(stat)
+            hotkeys.append(stat.get("ss58_address") if stat else None)
 
-            self.scores[uid] = score
+        # Calculate all the scores at once, zero for the validators, the nodes without IP address and the blacklisted ones
+        scores = calc_score_batch(responses, hotkeys, registered_hotkeys) * queryable_mask
+        self.scores = torch.from_numpy(scores.astype(np.float32))
+        self.scores_uids = uids
 
         bt.logging.info(f"🔢 Synced scores : {self.scores.tolist()}")
 
@@ -293,9 +306,21 @@ class Validator:
         Resync our local state with the latest state from the blockchain.
         Sync scores with metagraph.
         Get the current uids of all miners in the network.
+        The metagraph is synced aside then swapped under the lock, the readers never see a partially synced one.
         """
-        self.metagraph.sync(subtensor=self.subtensor)
-        self.uids = self.metagraph.uids.tolist()
+        metagraph = self._metagraph_subtensor.metagraph(self.config.netuid)
+        with self._metagraph_lock:
+            self._metagraph = metagraph
+            self.uids = metagraph.uids.tolist()
+
+    def refresh_metagraph(self):
+        """Resync the metagraph every block, run by the background refresh thread."""
+        while True:
+            try:
+                self.sync_local()
+            except Exception as e:
+                bt.logging.error(f"Error while syncing the metagraph: {e}")
+            time.sleep(bt_blocktime)
 
     def sync_status(self):
         # Check if the validator is still registered
@@ -318,8 +343,10 @@ class Validator:
 
     def sync_miners_info(self, queryable_tuple_uids_axons: List[Tuple[int, bt.AxonInfo]]):
         if queryable_tuple_uids_axons:
+            # Pairs known before the sync, built once for all the miners
+            current_pairs = set(self.miners.items())
             for uid, axon in queryable_tuple_uids_axons:
-                if self.miners_items_to_set and (uid, axon.hotkey) not in self.miners_items_to_set:
+                if current_pairs and (uid, axon.hotkey) not in current_pairs:
                     try:
                         bt.logging.info(f"❌ Miner {uid}-{self.miners[uid]} has been deregistered. Clean up old entries.")
                         purge_miner_entries(self.db, uid, self.miners[uid])
@@ -331,42 +358,15 @@ class Validator:
         else:
             bt.logging.warning(f"❌ No queryable miners.")
 
-    def calc_difficulty(self, uid):
-        difficulty = pow_min_difficulty
-        try:
-            stat = self.stats[uid]
-            current_difficulty = math.ceil(force_to_float_or_default(stat.get("last_20_difficulty_avg"), default=pow_min_difficulty))
-            last_20_challenge_failed = force_to_float_or_default(stat.get("last_20_challenge_failed"))
-            challenge_successes = force_to_float_or_default(stat.get("challenge_successes"))
-            if challenge_successes >= 20:
-                if last_20_challenge_failed == 0:
-                    difficulty = current_difficulty + 1
-                elif last_20_challenge_failed > 2:
-                    difficulty = current_difficulty - 1
-                else:
-                    difficulty = current_difficulty
-        except KeyError:
-            pass
-        except Exception as e:
-            bt.logging.error(f"{e} => difficulty minimal: {pow_min_difficulty} attributed for {uid}")
-        return max(difficulty, 1)
+    def calc_difficulties(self, uids: list) -> Dict[int, int]:
+        return dict(zip(uids, calc_difficulty_batch([self.stats.get(uid) for uid in uids]).tolist()))
 
     @staticmethod
     def filter_axons(queryable_tuple_uids_axons: List[Tuple[int, bt.AxonInfo]]):
         """Filter the axons with uids_list, remove those with the same IP address."""
-        # Set to keep track of unique identifiers
-        valid_ip_addresses = set()
-
-        # List to store filtered axons
-        dict_filtered_axons = {}
-        for uid, axon in queryable_tuple_uids_axons:
-            ip_address = axon.ip
-
-            if ip_address not in valid_ip_addresses:
-                valid_ip_addresses.add(ip_address)
-                dict_filtered_axons[uid] = axon
-
-        return dict_filtered_axons
+        # First uid seen for each IP address
+        first_uid_by_ip = {}
+        return {uid: axon for uid, axon in queryable_tuple_uids_axons if first_uid_by_ip.setdefault(axon.ip, uid) == uid}
 
     def filter_axon_version(self, dict_filtered_axons: dict):
         # Get the minimal miner version
@@ -381,61 +381,26 @@ class Validator:
                 dict_filtered_axons_version[uid] = axon
         return dict_filtered_axons_version
 
-    def is_blacklisted(self, neuron: bt.NeuronInfoLite):
-        coldkey = neuron.coldkey
-        hotkey = neuron.hotkey
-
-        # Blacklist coldkeys that are blacklisted by user
-        if coldkey in self.blacklist_coldkeys:
-            bt.logging.trace(f"Blacklisted recognized coldkey {coldkey} - with hotkey: {hotkey}")
-            return True
-
-        # Blacklist coldkeys that are blacklisted by user or by set of hotkeys
-        if hotkey in self.blacklist_hotkeys:
-            bt.logging.trace(f"Blacklisted recognized hotkey {hotkey}")
-            # Add the coldkey attached to this hotkey in the blacklisted coldkeys
-            self.blacklist_hotkeys.add(coldkey)
-            return True
+    def get_valid_mask(self, metagraph) -> np.ndarray:
+        """Mask of the neurons serving an axon and not blacklisted, the keys are checked on all the neurons at once."""
+        neurons = metagraph.neurons
+        hotkeys = np.array([neuron.hotkey for neuron in neurons])
+        coldkeys = np.array([neuron.coldkey for neuron in neurons])
+        ip_addresses = np.array([neuron.axon_info.ip for neuron in neurons])
+        return (ip_addresses != "0.0.0.0") & ~np.isin(hotkeys, list(self._denied_hotkeys)) & ~np.isin(coldkeys, list(self._denied_coldkeys))
 
-        # Blacklist coldkeys that are exploiters
-        if coldkey in self.exploiters_coldkeys:
-            bt.logging.trace(f"Blacklisted exploiter coldkey {coldkey} - with hotkey: {hotkey}")
-            return True
-
-        # Blacklist hotkeys that are exploiters
-        if hotkey in self.exploiters_hotkeys:
-            bt.logging.trace(f"Blacklisted exploiter hotkey {hotkey}")
-            # Add the coldkey attached to this hotkey in the blacklisted coldkeys
-            self.exploiters_hotkeys.add(coldkey)
-            return True
-
-        return False
-
-    def get_valid_tensors(self, metagraph):
-        tensors = []
-        for uid in metagraph.uids:
-            neuron = metagraph.neurons[uid]
-
-            if neuron.axon_info.ip != "0.0.0.0" and not self.is_blacklisted(neuron=neuron):
-                tensors.append(True)
-            else:
-                tensors.append(False)
-
-        return tensors
+    def get_queryable_mask(self, metagraph) -> np.ndarray:
+        # Validators are not queried
+        return self.get_valid_mask(metagraph) & (metagraph.total_stake < 1.024e3).numpy()
 
     def get_valid_queryable(self):
-        valid_queryable = []
-        for uid in self.uids:
-            neuron: bt.NeuronInfoLite = self.metagraph.neurons[uid]
-            axon = self.metagraph.axons[uid]
-
-            if neuron.axon_info.ip != "0.0.0.0" and self.metagraph.total_stake[uid] < 1.024e3 and not self.is_blacklisted(neuron=neuron):
-                valid_queryable.append((uid, axon))
-
-        return valid_queryable
+        metagraph = self.metagraph
+        mask = self.get_queryable_mask(metagraph)
+        return [(uid, metagraph.axons[uid]) for uid in np.flatnonzero(mask).tolist()]
 
     def get_queryable(self):
-        queryable = self.get_valid_queryable()
+        with self._metagraph_lock:
+            queryable = self.get_valid_queryable()
 
         # Execute a cleanup of the stats and miner information if the miner has been dereg
         self.sync_miners_info(queryable)
@@ -444,99 +409,92 @@ class Validator:
         dict_filtered_axons = self.filter_axon_version(dict_filtered_axons=dict_filtered_axons)
         return dict_filtered_axons
 
-    def execute_pow_request(self, uid, axon: bt.AxonInfo, _hash, _salt, mode, chars, mask, difficulty):
-        dendrite = bt.dendrite(wallet=self.wallet)
-        start_time = time.time()
-        bt.logging.info(f"Querying for {Challenge.__name__} - {uid}/{axon.hotkey}/{_hash}/{difficulty}")
-        response = dendrite.query(
-            axon,
-            Challenge(
-                challenge_hash=_hash,
-                challenge_salt=_salt,
-                challenge_mode=mode,
-                challenge_chars=chars,
-                challenge_mask=mask,
-                challenge_difficulty=difficulty,
-            ),
-            timeout=pow_timeout,
-        )
-        elapsed_time = time.time() - start_time
-        response_password = response.get("password", "")
-        hashed_response = gen_hash(response_password, _salt)[0] if response_password else ""
-        success = True if _hash == hashed_response else False
-        result_data = {
-            "ss58_address": axon.hotkey,
-            "success": success,
-            "elapsed_time": elapsed_time,
-            "difficulty": difficulty,
-        }
-        with self.lock:
-            self.pow_responses[uid] = response
-            self.new_pow_benchmark[uid] = result_data
+    async def query_challenge(self, semaphore: asyncio.Semaphore, axon: bt.AxonInfo, challenge: Challenge) -> Tuple[dict, float]:
+        """
+        Send the challenge to the axon once a slot of the semaphore is free.
+        :return: (the deserialized response, the elapsed time of the request itself)
+        """
+        async with semaphore:
+            start_time = time.time()
+            response = await self._async_dendrite.call(axon, challenge, timeout=pow_timeout)
+            return response, time.time() - start_time
 
-    def execute_specs_request(self):
-        if len(self.queryable_for_specs) > 0:
-            return
-        else:
-            # Miners to query this block
-            self.queryable_for_specs = self.queryable.copy()
+    def get_specs_app(self) -> Optional[Tuple[Fernet, str]]:
+        """
+        Generate the specs app with a new secret key, only when the script changed or the app is older than specs_app_rotation_delay.
+        :return: (cipher_suite, specs_input), None if the app could not be generated
+        """
+        script_hash = ag.get_script_hash()
+        if self.specs_app is not None:
+            app_script_hash, app_generated_at, cipher_suite, specs_input = self.specs_app
+            if app_script_hash == script_hash and time.time() - app_generated_at < specs_app_rotation_delay:
+                return cipher_suite, specs_input
 
-        bt.logging.info(f"💻 Initialisation of the {Specs.__name__} queries...")
         # # Prepare app_data for benchmarking
         # # Generate secret key for app
         secret_key = Fernet.generate_key()
         cipher_suite = Fernet(secret_key)
-        # # Compile the script and generate an exe.
-        ag.run(secret_key)
+        # # Compile the script and generate an exe, nothing is cached on failure so the next round tries again.
+        if not ag.run(secret_key):
+            return None
         try:
-            main_dir = os.path.dirname(os.path.abspath(__file__))
-            file_name = os.path.join(main_dir, "Validator/dist/script")
             # Read the exe file and save it to app_data.
-            with open(file_name, "rb") as file:
+            with open(ag.app_name, "rb") as file:
                 # Read the entire content of the EXE file
                 app_data = file.read()
         except Exception as e:
             bt.logging.error(f"{e}")
+            return None
+
+        # The app is sent as its bytes representation, built once for all the batches
+        specs_input = repr(app_data)
+        self.specs_app = (script_hash, time.time(), cipher_suite, specs_input)
+        return cipher_suite, specs_input
+
+    def execute_specs_request(self):
+        if len(self.queryable_for_specs) > 0:
             return
+        else:
+            # Miners to query this block
+            self.queryable_for_specs = self.queryable.copy()
+
+        bt.logging.info(f"💻 Initialisation of the {Specs.__name__} queries...")
+        specs_app = self.get_specs_app()
+        if specs_app is None:
+            # Empty the miners to query, so the next hardware round starts again
+            self.queryable_for_specs = {}
+            return
+        cipher_suite, specs_input = specs_app
 
         results = {}
         while len(self.queryable_for_specs) > 0:
             uids = list(self.queryable_for_specs.keys())
             queryable_for_specs_uids = random.sample(uids, self.validator_specs_batch_size) if len(uids) > self.validator_specs_batch_size else uids
-            queryable_for_specs_uid = []
-            queryable_for_specs_axon = []
-            queryable_for_specs_hotkey = []
-
-            for uid, axon in self.queryable_for_specs.items():
-                if uid in queryable_for_specs_uids:
-                    queryable_for_specs_uid.append(uid)
-                    queryable_for_specs_axon.append(axon)
-                    queryable_for_specs_hotkey.append(axon.hotkey)
-
-            for uid in queryable_for_specs_uids:
-                del self.queryable_for_specs[uid]
+            # Axons and hotkeys of the batch, taken out of the miners left to query
+            queryable_for_specs_axon = [self.queryable_for_specs.pop(uid) for uid in queryable_for_specs_uids]
+            queryable_for_specs_hotkey = [axon.hotkey for axon in queryable_for_specs_axon]
 
             try:
                 # Query the miners for benchmarking
-                bt.logging.info(f"💻 Hardware list of uids queried: {queryable_for_specs_uid}")
-                responses = self.dendrite.query(queryable_for_specs_axon, Specs(specs_input=repr(app_data)), timeout=specs_timeout)
+                bt.logging.info(f"💻 Hardware list of uids queried: {queryable_for_specs_uids}")
+                responses = self.dendrite.query(queryable_for_specs_axon, Specs(specs_input=specs_input), timeout=specs_timeout)
 
                 # Format responses and save them to benchmark_responses
                 for index, response in enumerate(responses):
                     try:
                         if response:
-                            binary_data = ast.literal_eval(response)  # Convert str to binary data
+                            binary_data = bytes_literal_loads(response)  # Convert str to binary data
                             decrypted = cipher_suite.decrypt(binary_data)  # Decrypt str to binary data
-                            decoded_data = json.loads(decrypted.decode())  # Convert data to object
-                            results[queryable_for_specs_uid[index]] = (queryable_for_specs_hotkey[index], decoded_data)
+                            decoded_data = json_loads(decrypted)  # Convert data to object
+                            results[queryable_for_specs_uids[index]] = (queryable_for_specs_hotkey[index], decoded_data)
                         else:
-                            results[queryable_for_specs_uid[index]] = (queryable_for_specs_hotkey[index], {})
+                            results[queryable_for_specs_uids[index]] = (queryable_for_specs_hotkey[index], {})
                     except cryptography.fernet.InvalidToken:
                         bt.logging.warning(f"{queryable_for_specs_hotkey[index]} - InvalidToken")
-                        results[queryable_for_specs_uid[index]] = (queryable_for_specs_hotkey[index], {})
+                        results[queryable_for_specs_uids[index]] = (queryable_for_specs_hotkey[index], {})
                     except Exception as _:
                         traceback.print_exc()
-                        results[queryable_for_specs_uid[index]] = (queryable_for_specs_hotkey[index], {})
+                        results[queryable_for_specs_uids[index]] = (queryable_for_specs_hotkey[index], {})
 
             except Exception as e:
                 traceback.print_exc()
@@ -547,30 +505,39 @@ class Validator:
             bt.logging.info(f"{hotkey} - {specs}")
         self.finalized_specs_once = True
 
-    def set_weights(self):
+    def set_weights(self, current_block: int):
         # Remove all negative scores and attribute them 0.
         self.scores[self.scores < 0] = 0
         # Normalize the scores into weights
         weights: torch.FloatTensor = torch.nn.functional.normalize(self.scores, p=1.0, dim=0).float()
         bt.logging.info(f"🏋️ Weight of miners : {weights.tolist()}")
+
+        # Do not send the same weights again, unless they were set more than weights_resubmit_rate_limit blocks ago
+        weights_hash = hash((tuple(self.scores_uids), tuple(weights.tolist())))
+        if weights_hash == self._last_weights_hash and current_block - self._last_weights_block < weights_resubmit_rate_limit:
+            bt.logging.info("🏋️ Weights unchanged since the last submission, skipping.")
+            return
         # This is a crucial step that updates the incentive mechanism on the Bittensor blockchain.
         # Miners with higher scores (or weights) receive a larger share of TAO rewards on this subnet.
         result = self.subtensor.set_weights(
             netuid=self.config.netuid,  # Subnet to set weights on.
             wallet=self.wallet,  # Wallet to sign set weights using hotkey.
-            uids=self.uids,  # Uids of the miners to set weights for.
+            uids=self.scores_uids,  # Uids of the miners to set weights for.
             weights=weights,  # Weights to set for the miners.
             version_key=__version_as_int__,
             wait_for_inclusion=False,
         )
         if result:
+            self._last_weights_hash = weights_hash
+            self._last_weights_block = current_block
             bt.logging.success("✅ Successfully set weights.")
         else:
             bt.logging.error("❌ Failed to set weights.")
 
-    def next_info(self, cond, next_block):
+    @staticmethod
+    def next_info(cond, next_block, current_block):
         if cond:
-            return calculate_next_block_time(self.current_block, next_block)
+            return calculate_next_block_time(current_block, next_block)
         else:
             return None
 
@@ -578,6 +545,11 @@ class Validator:
         """The Main Validation Loop"""
         self.loop = asyncio.get_running_loop()
 
+        # Keep-alive connections pool of the challenges dendrite, the session must be created within the running loop
+        self._async_dendrite._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.validator_challenge_batch_size * 4, keepalive_timeout=60)
+        )
+
         # Step 5: Perform queries to miners, scoring, and weight
         block_next_challenge = 1
         block_next_sync_status = 1
@@ -589,25 +561,29 @@ class Validator:
         time_next_set_weights = None
         time_next_hardware_info = None
 
+        self._metagraph_refresh_thread = threading.Thread(target=self.refresh_metagraph, name="th_refresh_metagraph", daemon=True)
+        self._metagraph_refresh_thread.start()
+
+        # Block of the iteration, read once so every check of the iteration sees the same block
+        current_block = self.current_block
+
         bt.logging.info("Starting validator loop.")
         while True:
             try:
-                self.sync_local()
-
-                if self.current_block not in self.blocks_done:
-                    self.blocks_done.add(self.current_block)
+                if current_block != self._last_processed_block:
+                    self._last_processed_block = current_block
 
-                    time_next_challenge = self.next_info(not block_next_challenge == 1, block_next_challenge)
-                    time_next_sync_status = self.next_info(not block_next_sync_status == 1, block_next_sync_status)
-                    time_next_set_weights = self.next_info(not block_next_set_weights == 1, block_next_set_weights)
+                    time_next_challenge = self.next_info(not block_next_challenge == 1, block_next_challenge, current_block)
+                    time_next_sync_status = self.next_info(not block_next_sync_status == 1, block_next_sync_status, current_block)
+                    time_next_set_weights = self.next_info(not block_next_set_weights == 1, block_next_set_weights, current_block)
                     time_next_hardware_info = self.next_info(
-                        not block_next_hardware_info == 1 and self.validator_perform_hardware_query, block_next_hardware_info
+                        not block_next_hardware_info == 1 and self.validator_perform_hardware_query, block_next_hardware_info, current_block
                     )
 
                     # Perform pow queries
-                    if self.current_block % block_next_challenge == 0 or block_next_challenge < self.current_block:
+                    if current_block % block_next_challenge == 0 or block_next_challenge < current_block:
                         # Next block the validators will challenge again.
-                        block_next_challenge = self.current_block + random.randint(50, 80)  # between ~ 10 and 16 minutes
+                        block_next_challenge = current_block + random.randint(50, 80)  # between ~ 10 and 16 minutes
 
                         # Filter axons with stake and ip address.
                         self._queryable_uids = self.get_queryable()
@@ -615,30 +591,48 @@ class Validator:
                         self.pow_requests = {}
                         self.new_pow_benchmark = {}
 
-                        self.threads = []
-                        for i in range(0, len(self.uids), self.validator_challenge_batch_size):
-                            for _uid in self.uids[i : i + self.validator_challenge_batch_size]:
-                                try:
-                                    axon = self._queryable_uids[_uid]
-                                    difficulty = self.calc_difficulty(_uid)
-                                    password, _hash, _salt, mode, chars, mask = run_validator_pow(length=difficulty)
-                                    self.pow_requests[_uid] = (password, _hash, _salt, mode, chars, mask, difficulty)
-                                    self.threads.append(
-                                        threading.Thread(
-                                            target=self.execute_pow_request,
-                                            args=(_uid, axon, _hash, _salt, mode, chars, mask, difficulty),
-                                            name=f"th_execute_pow_request-{_uid}",
-                                            daemon=True,
-                                        )
-                                    )
-                                except KeyError:
-                                    continue
-
-                        for thread in self.threads:
-                            thread.start()
-
-                        for thread in self.threads:
-                            thread.join()
+                        # Difficulties of the round, the stats do not change until its end
+                        difficulties = self.calc_difficulties(list(self._queryable_uids.keys()))
+
+                        # Build the challenges of all the queryable miners, each one with its own difficulty and password
+                        pow_uids = [uid for uid in self.uids if uid in self._queryable_uids]
+                        challenges = []
+                        for _uid in pow_uids:
+                            difficulty = difficulties[_uid]
+                            password, _hash, _salt, mode, chars, mask = run_validator_pow(length=difficulty)
+                            self.pow_requests[_uid] = (password, _hash, _salt, mode, chars, mask, difficulty)
+                            bt.logging.info(f"Querying for {Challenge.__name__} - {_uid}/{self._queryable_uids[_uid].hotkey}/{_hash}/{difficulty}")
+                            challenges.append(
+                                Challenge(
+                                    challenge_hash=_hash,
+                                    challenge_salt=_salt,
+                                    challenge_mode=mode,
+                                    challenge_chars=chars,
+                                    challenge_mask=mask,
+                                    challenge_difficulty=difficulty,
+                                )
+                            )
+
+                        # At most validator_challenge_batch_size requests in flight, the next one is sent as soon as one returns
+                        semaphore = asyncio.Semaphore(self.validator_challenge_batch_size)
+                        pow_responses = await asyncio.gather(
+                            *(self.query_challenge(semaphore, self._queryable_uids[_uid], challenge) for _uid, challenge in zip(pow_uids, challenges))
+                        )
+                        # The dendrite is reused, do not keep the history of every round
+                        self._async_dendrite.synapse_history.clear()
+
+                        # A single blake2b of the short password and salt (under a microsecond per miner), verified inline:
+                        # shipping it to a process pool would cost more in pickling than the hash itself.
+                        for _uid, (response, elapsed_time) in zip(pow_uids, pow_responses):
+                            _, _hash, _salt, _, _, _, difficulty = self.pow_requests[_uid]
+                            response_password = response.get("password", "") if response else ""
+                            hashed_response = gen_hash(response_password, _salt)[0] if response_password else ""
+                            self.new_pow_benchmark[_uid] = {
+                                "ss58_address": self._queryable_uids[_uid].hotkey,
+                                "success": _hash == hashed_response,
+                                "elapsed_time": elapsed_time,
+                                "difficulty": difficulty,
+                            }
 
                         self.pow_benchmark = self.new_pow_benchmark
                         self.pow_benchmark_success = {k: v for k, v in self.pow_benchmark.items() if v["success"] is True and v["elapsed_time"] < pow_timeout}
@@ -656,43 +650,50 @@ class Validator:
 
                         self.sync_scores()
 
-                    if (self.current_block % block_next_hardware_info == 0 and self.validator_perform_hardware_query) or (
-                        block_next_hardware_info < self.current_block and self.validator_perform_hardware_query
+                    if (current_block % block_next_hardware_info == 0 and self.validator_perform_hardware_query) or (
+                        block_next_hardware_info < current_block and self.validator_perform_hardware_query
                     ):
-                        block_next_hardware_info = self.current_block + 150  # ~ every 30 minutes
+                        block_next_hardware_info = current_block + 150  # ~ every 30 minutes
 
                         if not hasattr(self, "_queryable_uids"):
                             self._queryable_uids = self.get_queryable()
 
                         self.loop.run_in_executor(None, self.execute_specs_request)
 
-                    if self.current_block % block_next_sync_status == 0 or block_next_sync_status < self.current_block:
-                        block_next_sync_status = self.current_block + 25  # ~ every 5 minutes
+                    if current_block % block_next_sync_status == 0 or block_next_sync_status < current_block:
+                        block_next_sync_status = current_block + 25  # ~ every 5 minutes
                         self.sync_status()
 
                     # Periodically update the weights on the Bittensor blockchain, ~ every 20 minutes
-                    if self.current_block - self.last_updated_block > weights_rate_limit:
-                        block_next_set_weights = self.current_block + weights_rate_limit
+                    if current_block - self.last_updated_block > weights_rate_limit:
+                        block_next_set_weights = current_block + weights_rate_limit
                         self.sync_scores()
-                        self.set_weights()
-                        self.last_updated_block = self.current_block
-                        self.blocks_done.clear()
-                        self.blocks_done.add(self.current_block)
+                        self.set_weights(current_block)
+                        self.last_updated_block = current_block
 
+                with self._metagraph_lock:
+                    metagraph = self.metagraph
                 bt.logging.info(
                     (
-                        f"Block:{self.current_block} | "
-                        f"Stake:{self.metagraph.S[self.validator_subnet_uid]} | "
-                        f"Rank:{self.metagraph.R[self.validator_subnet_uid]} | "
-                        f"vTrust:{self.metagraph.validator_trust[self.validator_subnet_uid]} | "
-                        f"Emission:{self.metagraph.E[self.validator_subnet_uid]} | "
-                        f"next_challenge: #{block_next_challenge} ~ {time_next_challenge} | "
-                        f"sync_status: #{block_next_sync_status} ~ {time_next_sync_status} | "
-                        f"set_weights: #{block_next_set_weights} ~ {time_next_set_weights} | "
-                        f"hardware_info: #{block_next_hardware_info} ~ {time_next_hardware_info}"
+                        f"Block:{current_block} | "
+                        f"Stake:{metagraph.S[self.validator_subnet_uid]} | "
+                        f"Rank:{metagraph.R[self.validator_subnet_uid]} | "
+                        f"vTrust:{metagraph.validator_trust[self.validator_subnet_uid]} | "
+                        f"Emission:{metagraph.E[self.validator_subnet_uid]} | "
+                        f"next challenge/sync_status/set_weights/hardware_info: "
+                        f"#{block_next_challenge}/#{block_next_sync_status}/#{block_next_set_weights}/#{block_next_hardware_info}"
                     )
                 )
-                time.sleep(1)
+                if bt.logging.__debug_on__ or bt.logging.__trace_on__:
+                    bt.logging.debug(
+                        f"next_challenge ~ {time_next_challenge} | "
+                        f"sync_status ~ {time_next_sync_status} | "
+                        f"set_weights ~ {time_next_set_weights} | "
+                        f"hardware_info ~ {time_next_hardware_info}"
+                    )
+
+                # Next iteration once the next block is produced
+                current_block = wait_for_next_block(self.subtensor, current_block)
 
             # If we encounter an unexpected error, log it for debugging.
             except RuntimeError as e:
@@ -701,6 +702,7 @@ class Validator:
 
             # If the user interrupts the program, gracefully exit.
             except KeyboardInterrupt:
+                await self._async_dendrite.aclose_session()
                 self.db.close()
                 bt.logging.success("Keyboard interrupt detected. Exiting validator.")
                 exit()